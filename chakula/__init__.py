@@ -3,15 +3,21 @@
 
 import sys
 import time
+import random
 
 from datetime import datetime as dt
-from functools import reduce, lru_cache
+from calendar import timegm
+from functools import reduce
 from traceback import format_exception
 from bisect import bisect
 
 import feedparser
 import pygogo as gogo
 
+from chakula.fetch import fetch, get_digest, parse_modified
+from chakula.limiter import parse_retry_after, get_backoff, MAX_BACKOFF
+from chakula.sinks import HandlerSink
+
 __version__ = '0.8.0'
 __title__ = 'chakula'
 __package_name__ = 'chakula'
@@ -22,11 +28,48 @@ __license__ = 'BSD'
 __copyright__ = 'Copyright 2017 Reuben Cummings'
 
 LOGGER = gogo.Gogo(__name__, monolog=True).logger
+THROTTLED = {429, 503}
+MAX_FAILURES = 5
+MIN_DATE = timegm(time.strptime('1900', '%Y'))
+
+
+def to_epoch(value):
+    """Convert a UTC time tuple to an integer epoch timestamp.
+
+    >>> to_epoch((2012, 1, 5, 10, 41, 45, 3, 5, 0))
+    1325760105
+    >>> to_epoch(1325760105.5)
+    1325760105
+    >>> to_epoch(())
+    """
+    if isinstance(value, (int, float)):
+        return int(value)
+    elif value:
+        return timegm(value)
+
+
+def get_stamps(entries, key='published_parsed'):
+    """Epoch timestamps of an entry date field (0 if missing)."""
+    return [timegm(e[key]) if e.get(key) else 0 for e in entries]
+
+
+def select_newer(entries, stamps, newer_than):
+    return [e for e, stamp in zip(entries, stamps) if stamp > newer_than]
 
 
-@lru_cache(maxsize=32)
 def last_update(entry_dates):
-    return max(entry_dates) if entry_dates else time.strptime('1900', '%Y')
+    return max(entry_dates) if entry_dates else MIN_DATE
+
+
+def emit(entry, content, stream=sys.stdout, sinks=None):
+    if sinks:
+        for sink in sinks:
+            sink.put(entry, content)
+    else:
+        try:
+            stream.write(content)
+        except TypeError:
+            stream.write(content.encode('utf-8'))
 
 
 def write_entries(entries, **kwargs):
@@ -52,10 +95,7 @@ def write_entries(entries, **kwargs):
         else:
             content = '{}\n'.format(entry['title'])
 
-        try:
-            stream.write(content)
-        except TypeError:
-            stream.write(content.encode('utf-8'))
+        emit(entry, content, stream, kwargs.get('sinks'))
 
     try:
         stream.flush()
@@ -66,12 +106,100 @@ def write_entries(entries, **kwargs):
         kwargs['write_handler'](to_add)
 
 
+def throttle(url, response, **kwargs):
+    logger = kwargs.get('logger', LOGGER)
+    backoffs = kwargs.get('backoffs', 0) + 1
+    retry_after = parse_retry_after(response.headers.get('retry-after'))
+
+    if retry_after is None:
+        retry_after = get_backoff(backoffs, kwargs.get('backoff', 300))
+
+    msg = '%r returned status %s, retrying in %ss'
+    logger.warning(msg, url, response.status, retry_after)
+    # keep the circuit breaker state so that throttling a probe doesn't lift
+    # the feed's quarantine
+    keys = [
+        'etag', 'modified', 'updated', 'digest', 'failures', 'quarantined',
+        'error']
+    info = {k: kwargs.get(k) for k in keys}
+    retry_at = kwargs.get('clock', time).time() + retry_after
+    info.update({'backoffs': backoffs, 'retry_at': retry_at})
+    return info
+
+
+def trip(url, state, **kwargs):
+    """Record a failed poll of `url` and open its circuit breaker.
+
+    The feed is skipped for an exponentially increasing cooldown. After
+    `max_failures` consecutive failures it is quarantined and only probed once
+    every `probe` seconds.
+    """
+    logger = kwargs.get('logger', LOGGER)
+    failures = state.get('failures', 0) + 1
+    max_failures = kwargs.get('max_failures', MAX_FAILURES)
+    probe = kwargs.get('probe', MAX_BACKOFF)
+    quarantined = failures >= max_failures
+    error = sys.exc_info()[1]
+
+    if quarantined:
+        cooldown = probe
+    else:
+        cooldown = get_backoff(failures, kwargs.get('backoff', 300), probe)
+
+    if failures == 1:
+        traceback_strings = format_exception(*sys.exc_info())
+        logger.error(''.join(traceback_strings))
+    else:
+        msg = '%r failed %d times in a row: %s'
+        logger.error(msg, url, failures, repr(error))
+
+    if quarantined and not state.get('quarantined'):
+        logger.warning('quarantining %r', url)
+
+    info = dict(state)
+    info.update({
+        'failures': failures, 'quarantined': quarantined,
+        'error': repr(error),
+        'retry_at': kwargs.get('clock', time).time() + cooldown})
+
+    return info
+
+
 def parse_url(url, iteration, initial=None, **kwargs):
     logger = kwargs.get('logger', LOGGER)
     updated = kwargs.get('updated')
     newer = kwargs.get('newer')
-    pkwargs = {k: v for k, v in kwargs.items() if k in {'etag', 'modified'}}
-    feed = feedparser.parse(url, **pkwargs)
+    fetcher = kwargs.get('fetcher', fetch)
+    fkwargs = {k: v for k, v in kwargs.items() if k in {'etag', 'modified'}}
+    response = fetcher(url, **fkwargs)
+    headers = response.headers
+
+    if response.status in THROTTLED:
+        return [], throttle(url, response, **kwargs)
+    elif response.status >= 400:
+        raise ValueError('%r returned status %s' % (url, response.status))
+
+    modified = parse_modified(headers.get('last-modified'))
+
+    info = {
+        'etag': headers.get('etag', kwargs.get('etag')),
+        'modified': modified or kwargs.get('modified'),
+        'updated': updated,
+        'digest': kwargs.get('digest')}
+
+    if response.status == 304:
+        logger.debug('%r not modified', url)
+        return [], info
+
+    # many servers ignore etag/modified and send the same content every time
+    # so skip parsing if the content hasn't changed
+    info['digest'] = get_digest(response.body)
+
+    if info['digest'] == kwargs.get('digest'):
+        logger.debug('%r content unchanged', url)
+        return [], info
+
+    feed = feedparser.parse(response.body, response_headers=headers)
 
     if feed.bozo == 1:
         safeexc = (feedparser.CharacterEncodingOverride,)
@@ -82,33 +210,26 @@ def parse_url(url, iteration, initial=None, **kwargs):
 
     entries = feed.entries if iteration else feed.entries[:initial]
 
-    if updated and newer:
-        newer_than = max([updated, newer])
-    else:
-        newer_than = updated or newer
+    newer_than = max(updated or 0, newer or 0)
 
     if newer_than:
-        formatted = time.strftime('%Y/%m/%d %H:%M:%S', newer_than)
+        newer_tuple = time.gmtime(newer_than)
+        formatted = time.strftime('%Y/%m/%d %H:%M:%S', newer_tuple)
         logger.debug('selecting entries newer than %s', formatted)
-        entries = [
-            entry for entry in entries if entry.published_parsed > newer_than]
+        entries = select_newer(entries, get_stamps(entries), newer_than)
 
     if not feed.get('updated_parsed') and entries:
-        dates = (e.updated_parsed for e in entries if e.get('updated_parsed'))
-        def_updated = last_update(tuple(dates))
+        dates = [d for d in get_stamps(entries, 'updated_parsed') if d]
+        def_updated = last_update(dates)
     else:
         def_updated = updated
 
-    info = {
-        'etag': feed.get('etag', kwargs.get('etag')),
-        'modified': feed.get('modified_parsed'),
-        'updated': feed.get('updated_parsed') or def_updated}
-
+    info['updated'] = to_epoch(feed.get('updated_parsed')) or def_updated
     return entries, info
 
 
 def parse_interval(interval):
-    pairs = [('secs', 0), ('minutes', 60), ('hours', 3600), ('days', 86400)]
+    pairs = [('secs', 1), ('minutes', 60), ('hours', 3600), ('days', 86400)]
     grades = [pair[0] for pair in pairs]
     breakpoints = [pair[1] for pair in pairs][1:]
 
@@ -121,36 +242,120 @@ def parse_interval(interval):
     return round(interval / divisor, 2), grade
 
 
-def tail(urls, iteration=0, interval=300, extra=None, **kwargs):
+def update_urls(urls, extra, **kwargs):
+    """Get the latest urls from the `urls_handler` and drop the state of the
+    removed ones."""
     logger = kwargs.get('logger', LOGGER)
-    extra = extra or {}
+    checkpoint = kwargs.get('checkpoint_handler')
+    new_urls = kwargs['urls_handler'](urls)
 
-    if kwargs.get('iterations') and iteration >= kwargs['iterations']:
-        msg = 'maximum number of iterations reached: %d'
-        logger.info(msg, kwargs['iterations'])
-        return extra
-    elif iteration:
-        # sleep first so that we don't have to wait an interval before checking
-        # iteration count
-        parsed = parse_interval(interval)
-        logger.info('sleeping for {} {}'.format(*parsed))
-        time.sleep(interval)
+    if new_urls is not urls:
+        removed = set(urls).difference(new_urls)
+        added = len(set(new_urls).difference(urls))
 
-    for url in urls:
-        kwargs.update(extra.get(url, {}))
+        if removed or added:
+            msg = 'urls changed: %d added, %d removed'
+            logger.info(msg, added, len(removed))
 
-        try:
-            entries, extra[url] = parse_url(url, iteration, **kwargs)
-            kwargs.update(extra[url])
-            write_entries(entries, **kwargs)
-        except Exception:
-            if kwargs.get('fail'):
-                raise
-            else:
-                traceback_strings = format_exception(*sys.exc_info())
-                logger.error(''.join(traceback_strings))
+        for url in removed:
+            extra.pop(url, None)
+
+            if checkpoint:
+                checkpoint(url, None)
+
+    return new_urls
+
+
+def poll_url(url, iteration, state, interval=300, **kwargs):
+    """Fetch and write the new entries of a single url and return its
+    updated state."""
+    logger = kwargs.get('logger', LOGGER)
+
+    # keep the per feed state (etag, backoffs, etc.) from leaking into the
+    # next url
+    fkwargs = dict(kwargs, **state)
+    fkwargs.setdefault('backoff', interval)
+
+    try:
+        entries, info = parse_url(url, iteration, **fkwargs)
+        fkwargs.update(info)
+
+        if kwargs.get('rules'):
+            entries = kwargs['rules'](entries)
+
+        write_entries(entries, **fkwargs)
+    except Exception:
+        if kwargs.get('fail'):
+            raise
+        else:
+            info = trip(url, state, **fkwargs)
+    else:
+        if state.get('quarantined') and not info.get('quarantined'):
+            logger.info('%r recovered, lifting quarantine', url)
+
+    return info
+
+
+def poll(urls, iteration, interval=300, extra=None, **kwargs):
+    """Poll each url once and return the (possibly reloaded) urls."""
+    logger = kwargs.get('logger', LOGGER)
+    clock = kwargs.get('clock', time)
+    checkpoint = kwargs.get('checkpoint_handler')
+
+    if kwargs.get('urls_handler'):
+        urls = update_urls(urls, extra, **kwargs)
+
+    limiter = kwargs.get('limiter')
+
+    for url in limiter.order(urls) if limiter else urls:
+        state = extra.get(url, {})
+
+        if state.get('retry_at', 0) > clock.time():
+            logger.debug('skipping %r until its retry time', url)
+            continue
+        elif limiter:
+            limiter.wait(url)
+
+        extra[url] = poll_url(url, iteration, state, interval, **kwargs)
+
+        if checkpoint:
+            checkpoint(url, extra[url])
 
     if kwargs.get('tail_handler'):
         kwargs['tail_handler'](extra)
 
-    return tail(urls, iteration + 1, interval=interval, extra=extra, **kwargs)
+    return urls
+
+
+def tail(urls, iteration=0, interval=300, extra=None, **kwargs):
+    logger = kwargs.get('logger', LOGGER)
+    clock = kwargs.get('clock', time)
+    iterations = kwargs.get('iterations')
+    extra = extra or {}
+    handler_sink = None
+
+    if kwargs.get('sinks') and kwargs.get('write_handler'):
+        # call the write handler from its own thread like the other sinks so
+        # that it can't stall polling either
+        handler_sink = HandlerSink(kwargs.pop('write_handler'))
+        kwargs['sinks'] = list(kwargs['sinks']) + [handler_sink]
+
+    try:
+        while not (iterations and iteration >= iterations):
+            if iteration:
+                # sleep first so that we don't have to wait an interval
+                # before checking iteration count
+                jitter = random.uniform(0, kwargs.get('jitter') or 0)
+                delay = interval + jitter
+                parsed = parse_interval(delay)
+                logger.info('sleeping for {} {}'.format(*parsed))
+                clock.sleep(delay)
+
+            urls = poll(urls, iteration, interval, extra, **kwargs)
+            iteration += 1
+    finally:
+        if handler_sink:
+            handler_sink.close()
+
+    logger.info('maximum number of iterations reached: %d', iterations)
+    return extra
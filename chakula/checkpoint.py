@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+# vim: sw=4:ts=4:expandtab
+
+import os
+import pickle
+
+from io import open
+
+BATCH = 100
+
+
+def write_atomic(path, content):
+    """Write `content` (bytes) to `path` so that readers only ever see the
+    old or the new file, never a partially written one."""
+    tmp_path = '%s.tmp' % path
+
+    with open(tmp_path, 'wb') as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+
+    os.replace(tmp_path, path)
+
+
+def dump_atomic(path, obj):
+    """Pickle `obj` to `path` atomically (see `write_atomic`)."""
+    write_atomic(path, pickle.dumps(obj, pickle.HIGHEST_PROTOCOL))
+
+
+def scan_journal(path):
+    """Yield the (url, state) records of a journal along with the offset
+    they end at, stopping at the first record that was only partially
+    written."""
+    try:
+        f = open(path, 'rb')
+    except FileNotFoundError:
+        return
+
+    with f:
+        while True:
+            try:
+                record = pickle.load(f)
+            except (EOFError, ValueError, pickle.UnpicklingError):
+                break
+            else:
+                yield record, f.tell()
+
+
+def read_journal(path):
+    """Yield the (url, state) records of a journal, ignoring a record that
+    was only partially written."""
+    for record, _ in scan_journal(path):
+        yield record
+
+
+def get_valid_size(path):
+    """The size of a journal up to the end of its last complete record."""
+    size = 0
+
+    for _, size in scan_journal(path):
+        pass
+
+    return size
+
+
+def get_log_path(path):
+    return '%s.wal' % path
+
+
+def apply_journal(path, extra):
+    """Apply the checkpoints logged for the cache at `path` to `extra`."""
+    for url, state in read_journal(get_log_path(path)):
+        if state is None:
+            extra.pop(url, None)
+        else:
+            extra[url] = state
+
+    return extra
+
+
+class Journal(object):
+    """I write a per feed checkpoint to a write-ahead log next to the cache.
+
+    Each checkpoint pairs a feed's url with its state (etag, updated, etc.)
+    right after its entries have been emitted, so a restart resumes every
+    feed from its last checkpoint instead of the last full cache save.
+    Delivery is at-least-once: a crash between emitting a feed's entries and
+    checkpointing it re-emits them. Checkpoints are flushed to the OS
+    immediately (surviving a process crash) but only fsynced every `batch`
+    checkpoints (bounding the cost at thousands of feeds), so an OS crash
+    can re-emit up to `batch` feeds' worth of entries. `compact` folds the
+    log into the cache. A record left partially written by a crash is
+    truncated on open so that new checkpoints aren't appended after it
+    (where they'd never be read).
+    """
+    def __init__(self, path, batch=BATCH):
+        self.path = path
+        self.log_path = get_log_path(path)
+        self.batch = max(batch, 1)
+        self.pending = 0
+        self.file = open(self.log_path, 'ab')
+        self.file.truncate(get_valid_size(self.log_path))
+
+    def sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.pending = 0
+
+    def checkpoint(self, url, state):
+        pickle.dump((url, state), self.file, pickle.HIGHEST_PROTOCOL)
+        self.file.flush()
+        self.pending += 1
+
+        if self.pending >= self.batch:
+            self.sync()
+
+    def compact(self, extra):
+        """Save `extra` to the cache and truncate the log."""
+        dump_atomic(self.path, extra)
+        self.file.close()
+        self.file = open(self.log_path, 'wb')
+        self.pending = 0
+        return self.path
+
+    def close(self):
+        self.sync()
+        self.file.close()
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+# vim: sw=4:ts=4:expandtab
+
+import os
+
+from io import open
+from xml.etree.ElementTree import iterparse, ParseError
+
+import pygogo as gogo
+
+OPML_EXTS = {'.opml', '.xml'}
+
+logger = gogo.Gogo(__name__, monolog=True).logger
+
+
+def read_opml(path):
+    """Yield the feed urls (`xmlUrl` attributes) of an OPML file."""
+    for _, elem in iterparse(path):
+        if elem.tag == 'outline' and elem.get('xmlUrl'):
+            yield elem.get('xmlUrl').strip()
+
+        elem.clear()
+
+
+def read_text(path):
+    """Yield the urls of a plain text file (one per line, `#` comments)."""
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            url = line.strip()
+
+            if url and not url.startswith('#'):
+                yield url
+
+
+def is_opml(path):
+    if os.path.splitext(path)[1].lower() in OPML_EXTS:
+        return True
+
+    with open(path, 'rb') as f:
+        return f.read(64).lstrip().startswith(b'<')
+
+
+def read_urls(path):
+    """Read a list of feed urls from an OPML or plain text file.
+
+    Duplicates are removed while keeping the original ordering.
+    """
+    reader = read_opml if is_opml(path) else read_text
+    return list(dict.fromkeys(reader(path)))
+
+
+class UrlsFile(object):
+    """I watch a urls file and reload it whenever it changes.
+
+    Instances are meant to be passed to `tail` as the `urls_handler`. The file
+    is only re-read when its mtime or size changes, so calling me once per
+    iteration is cheap even for very large subscription lists. A change is
+    only applied once the file has stayed the same for two calls (so that a
+    file being rewritten in place isn't read half written), and an empty file
+    never replaces a non-empty one.
+    """
+    def __init__(self, path, static=None):
+        self.path = path
+        self.static = list(static or [])
+        self.stamp = self.pending = None
+        self.read = []
+        self.urls = list(self.static)
+        self.reload(self.get_stamp(strict=True))
+
+    def get_stamp(self, strict=False):
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            if strict:
+                raise
+
+            stamp = None
+        else:
+            stamp = (stat.st_mtime_ns, stat.st_size)
+
+        return stamp
+
+    def reload(self, stamp):
+        self.stamp, self.pending = stamp, None
+
+        try:
+            urls = read_urls(self.path)
+        except (ParseError, UnicodeDecodeError) as e:
+            logger.error('could not read urls file %r: %s', self.path, e)
+        else:
+            if self.read and not urls:
+                logger.warning('ignoring empty urls file %r', self.path)
+            else:
+                self.read = urls
+                self.urls = list(dict.fromkeys(self.static + urls))
+
+        return self.urls
+
+    def __call__(self, urls=None):
+        stamp = self.get_stamp()
+
+        if stamp in {None, self.stamp}:
+            self.pending = None
+        elif stamp != self.pending:
+            # wait for the file to settle before reading it
+            self.pending = stamp
+        else:
+            logger.info('reloading urls file %r', self.path)
+            self.reload(stamp)
+
+        return self.urls
@@ -0,0 +1,204 @@
+# -*- coding: utf-8 -*-
+# vim: sw=4:ts=4:expandtab
+
+import os
+import json
+import time
+import zlib
+
+from collections import namedtuple
+from email.utils import formatdate, parsedate_tz, mktime_tz
+from gzip import decompress
+from hashlib import sha1
+from io import open
+from urllib.error import HTTPError
+from urllib.parse import urlparse
+from urllib.request import Request, urlopen, url2pathname
+
+import feedparser
+
+from chakula.checkpoint import write_atomic
+
+REMOTE_SCHEMES = {'http', 'https', 'ftp'}
+TIMEOUT = 30
+
+Response = namedtuple('Response', ['url', 'status', 'headers', 'body'])
+
+
+def get_digest(content):
+    return sha1(content).hexdigest()
+
+
+def get_path(url):
+    """Return the local file path of a url, or None if it's a remote url.
+
+    >>> get_path('http://example.com/feed.rss')
+    >>> get_path('file:///tmp/feed.rss')
+    '/tmp/feed.rss'
+    >>> get_path('tests/feeds/jenkins.rss')
+    'tests/feeds/jenkins.rss'
+    """
+    parsed = urlparse(url)
+
+    if parsed.scheme in REMOTE_SCHEMES:
+        path = None
+    elif parsed.scheme == 'file':
+        path = url2pathname(parsed.netloc + parsed.path)
+    else:
+        path = url
+
+    return path
+
+
+def format_modified(modified):
+    """Format a `modified` epoch timestamp as an HTTP date.
+
+    >>> format_modified(1325760105)
+    'Thu, 05 Jan 2012 10:41:45 GMT'
+    """
+    return formatdate(modified, usegmt=True)
+
+
+def parse_modified(value):
+    """Parse an HTTP date into an epoch timestamp.
+
+    >>> parse_modified('Thu, 05 Jan 2012 10:41:45 GMT')
+    1325760105
+    """
+    parsed = parsedate_tz(value) if value else None
+    return mktime_tz(parsed) if parsed else None
+
+
+def decode(body, encoding):
+    if encoding == 'gzip':
+        body = decompress(body)
+    elif encoding == 'deflate':
+        try:
+            body = zlib.decompress(body)
+        except zlib.error:
+            body = zlib.decompress(body, -zlib.MAX_WBITS)
+
+    return body
+
+
+def read_file(url, path, etag=None):
+    """Read a local feed file.
+
+    The file's mtime and size act as its etag, so an unchanged file is never
+    read.
+    """
+    stat = os.stat(path)
+    headers = {
+        'content-type': 'application/xml',
+        'etag': '"%x-%x"' % (stat.st_mtime_ns, stat.st_size),
+        'last-modified': formatdate(stat.st_mtime, usegmt=True)}
+
+    if etag == headers['etag']:
+        return Response(url, 304, headers, b'')
+
+    with open(path, 'rb') as f:
+        body = f.read()
+
+    return Response(url, 200, headers, body)
+
+
+def fetch(url, etag=None, modified=None, **kwargs):
+    """Fetch the raw content of a feed.
+
+    Args:
+        url (str): The feed url or local file path.
+        etag (str): The ETag of the previous response.
+        modified (int): The Last-Modified epoch of the previous response.
+
+    Returns:
+        Response: The response. Headers have lower-cased keys and the body
+            is bytes.
+    """
+    path = get_path(url)
+
+    if path is not None:
+        return read_file(url, path, etag)
+
+    headers = {
+        'User-Agent': kwargs.get('agent', feedparser.USER_AGENT),
+        'Accept-Encoding': 'gzip, deflate'}
+
+    if etag:
+        headers['If-None-Match'] = etag
+
+    if modified:
+        headers['If-Modified-Since'] = format_modified(modified)
+
+    request = Request(url, headers=headers)
+
+    try:
+        r = urlopen(request, timeout=kwargs.get('timeout', TIMEOUT))
+    except HTTPError as e:
+        r = e
+
+    with r:
+        status = r.getcode()
+        rheaders = {k.lower(): v for k, v in r.headers.items()}
+        body = decode(r.read(), rheaders.get('content-encoding'))
+
+    rheaders.setdefault('content-location', r.geturl())
+    return Response(r.geturl(), status, rheaders, body)
+
+
+class BodyCache(object):
+    """I keep the most recent raw response of each feed on disk.
+
+    Wrap a fetcher with me to save every successful response under `path`.
+    Saved responses can then be served again with `replay`, e.g., for
+    debugging, or instead of fetching if I'm `offline`.
+    """
+    def __init__(self, path, fetcher=fetch, offline=False):
+        self.path = path
+        self.fetcher = fetcher
+        self.offline = offline
+        os.makedirs(path, exist_ok=True)
+
+    def get_paths(self, url):
+        base = os.path.join(self.path, get_digest(url.encode('utf-8')))
+        return '%s.body' % base, '%s.json' % base
+
+    def save(self, url, response):
+        body_path, meta_path = self.get_paths(url)
+        write_atomic(body_path, response.body)
+
+        # the digest ties the metadata to its body in case we crash between
+        # writing the two
+        meta = {
+            'url': response.url, 'status': response.status,
+            'headers': response.headers, 'fetched': time.time(),
+            'digest': get_digest(response.body)}
+
+        write_atomic(meta_path, json.dumps(meta).encode('utf-8'))
+
+    def replay(self, url, **kwargs):
+        body_path, meta_path = self.get_paths(url)
+
+        try:
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+
+            with open(body_path, 'rb') as f:
+                body = f.read()
+        except FileNotFoundError:
+            raise LookupError('%r is not in body cache %r' % (url, self.path))
+
+        if get_digest(body) != meta['digest']:
+            raise ValueError('%r has a corrupt body cache entry' % url)
+
+        return Response(meta['url'], meta['status'], meta['headers'], body)
+
+    def __call__(self, url, **kwargs):
+        if self.offline:
+            return self.replay(url, **kwargs)
+
+        response = self.fetcher(url, **kwargs)
+
+        if response.status == 200:
+            self.save(url, response)
+
+        return response
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+# vim: sw=4:ts=4:expandtab
+
+import re
+
+from io import open
+from urllib.parse import urlparse
+
+KINDS = {'keyword', 'regex', 'author', 'category', 'domain'}
+TEXT_FIELDS = ['title', 'description']
+FLAGS = re.compile('').flags
+
+
+def parse_rule(rule):
+    """Parse a `[!]kind: value` rule into a (kind, value, exclude) tuple.
+
+    >>> parse_rule('keyword: python')
+    ('keyword', 'python', False)
+    >>> parse_rule('!domain: Example.com')
+    ('domain', 'Example.com', True)
+    """
+    kind, sep, value = rule.partition(':')
+    kind = kind.strip().lower()
+    exclude = kind.startswith('!')
+    kind = kind.lstrip('!').strip()
+
+    if not (sep and kind in KINDS and value.strip()):
+        msg = 'invalid filter rule {!r} - hint: keyword: python, !author: me'
+        raise ValueError(msg.format(rule))
+
+    return kind, value.strip(), exclude
+
+
+def read_rules(path):
+    """Read filter rules from a file (one per line, `#` comments)."""
+    with open(path, encoding='utf-8') as f:
+        lines = (line.strip() for line in f)
+        return [line for line in lines if line and not line.startswith('#')]
+
+
+def compile_regex(regex):
+    """Compile a regex rule and check whether it can be safely alternated
+    with other rules, i.e., it has no groups (which backreferences and
+    named groups rely on) and no global inline flags.
+
+    >>> compile_regex('python[0-9]')[1]
+    True
+    >>> compile_regex('(a)b')[1]
+    False
+    >>> compile_regex('(?i)failure')[1]
+    False
+    """
+    try:
+        plain = re.compile(regex)
+    except re.error as e:
+        raise ValueError('invalid filter regex {!r}: {}'.format(regex, e))
+
+    combinable = not plain.groups and plain.flags == FLAGS
+    return re.compile(regex, re.I), combinable
+
+
+def get_domains(url):
+    """The domain of a url along with all its parent domains.
+
+    >>> get_domains('http://www.Example.com:80/feed')
+    ['www.example.com', 'example.com', 'com']
+    """
+    labels = (urlparse(url).hostname or '').split('.')
+    return ['.'.join(labels[i:]) for i in range(len(labels)) if labels[i]]
+
+
+class Matcher(object):
+    """I check whether an entry matches any of a set of rules.
+
+    All keyword rules and the regex rules without groups or global flags
+    are compiled into a single alternated regex so each entry's text is only
+    scanned once. The other regex rules are matched separately so that their
+    group numbers, group names, and flags keep their meaning. Author,
+    category, and domain rules are set lookups. Matching is case insensitive.
+    """
+    def __init__(self, rules):
+        values = {kind: [] for kind in KINDS}
+
+        for kind, value in rules:
+            values[kind].append(value)
+
+        patterns, self.regexes = [], []
+
+        for regex in values['regex']:
+            compiled, combinable = compile_regex(regex)
+
+            if combinable:
+                patterns.append('(?:%s)' % regex)
+            else:
+                self.regexes.append(compiled)
+
+        if values['keyword']:
+            keywords = '|'.join(map(re.escape, values['keyword']))
+            patterns.append(r'(?<!\w)(?:%s)(?!\w)' % keywords)
+
+        if patterns:
+            self.regexes.insert(0, re.compile('|'.join(patterns), re.I))
+
+        self.authors = {v.lower() for v in values['author']}
+        self.categories = {v.lower() for v in values['category']}
+        self.domains = {v.lower() for v in values['domain']}
+        self.empty = not (
+            self.regexes or self.authors or self.categories or self.domains)
+
+    def __call__(self, entry):
+        if self.regexes:
+            text = '\n'.join(entry.get(field, '') for field in TEXT_FIELDS)
+
+            if any(regex.search(text) for regex in self.regexes):
+                return True
+
+        if self.authors and entry.get('author', '').lower() in self.authors:
+            return True
+
+        if self.categories:
+            tags = entry.get('tags', [])
+            terms = {(tag.get('term') or '').lower() for tag in tags}
+
+            if not terms.isdisjoint(self.categories):
+                return True
+
+        if self.domains:
+            domains = get_domains(entry.get('link', ''))
+            return not self.domains.isdisjoint(domains)
+
+        return False
+
+
+class Rules(object):
+    """I filter entries using include and exclude (`!`) rules.
+
+    An entry is kept if it matches any include rule (or there are none) and
+    doesn't match any exclude rule.
+    """
+    def __init__(self, rules):
+        parsed = [parse_rule(rule) for rule in rules]
+        self.include = Matcher((k, v) for k, v, ex in parsed if not ex)
+        self.exclude = Matcher((k, v) for k, v, ex in parsed if ex)
+
+    def keep(self, entry):
+        if not (self.include.empty or self.include(entry)):
+            return False
+
+        return self.exclude.empty or not self.exclude(entry)
+
+    def __call__(self, entries):
+        return [entry for entry in entries if self.keep(entry)]
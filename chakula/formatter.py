@@ -38,6 +38,15 @@ class Formatter(object):
         self.fmt = fmt
         self.time_fmt = time_fmt
 
+    def __eq__(self, other):
+        if isinstance(other, Formatter):
+            return (self.fmt, self.time_fmt) == (other.fmt, other.time_fmt)
+        else:
+            return NotImplemented
+
+    def __hash__(self):
+        return hash((self.fmt, self.time_fmt))
+
     @classmethod
     def from_fields(cls, fields, time_fmt=DEF_TIME_FMT, show_heading=False):
         fmt = []
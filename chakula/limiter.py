@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+# vim: sw=4:ts=4:expandtab
+
+import time
+
+from email.utils import parsedate_tz, mktime_tz
+from itertools import chain, zip_longest
+from urllib.parse import urlparse
+
+MAX_BACKOFF = 86400
+
+
+def get_host(url):
+    return urlparse(url).netloc.lower()
+
+
+def parse_retry_after(value, now=None):
+    """Parse a `Retry-After` header into a number of seconds.
+
+    >>> parse_retry_after('120')
+    120
+    >>> parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT', 1445412420)
+    60
+    >>> parse_retry_after('soon')
+    """
+    try:
+        return max(int(value), 0)
+    except (TypeError, ValueError):
+        parsed = parsedate_tz(value) if value else None
+
+    if parsed:
+        now = time.time() if now is None else now
+        return max(int(mktime_tz(parsed) - now), 0)
+
+
+def get_backoff(attempts, base, cap=MAX_BACKOFF):
+    """Exponential backoff delay (in seconds) for the given attempt.
+
+    >>> get_backoff(1, 60)
+    60
+    >>> get_backoff(3, 60)
+    240
+    >>> get_backoff(30, 60)
+    86400
+    """
+    return min(base * 2 ** (max(attempts, 1) - 1), cap)
+
+
+class HostLimiter(object):
+    """I limit the rate of requests per host with a token bucket.
+
+    Each host gets `burst` tokens which refill at `rate` tokens per second.
+    Urls without a host (local files) are never limited.
+    """
+    def __init__(self, rate, burst=1, clock=time):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.clock = clock
+        self.buckets = {}
+
+    def order(self, urls):
+        """Interleave urls by host so consecutive requests hit different
+        hosts."""
+        groups = {}
+
+        for url in urls:
+            groups.setdefault(get_host(url), []).append(url)
+
+        interleaved = chain.from_iterable(zip_longest(*groups.values()))
+        return [url for url in interleaved if url is not None]
+
+    def delay(self, url, now=None):
+        """Consume a token for the url's host and return how long to wait
+        before sending the request."""
+        host = get_host(url)
+
+        if not host:
+            return 0
+
+        now = self.clock.time() if now is None else now
+        tokens, last = self.buckets.get(host, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - last) * self.rate)
+        delay = (1 - tokens) / self.rate if tokens < 1 else 0
+        self.buckets[host] = (tokens + delay * self.rate - 1, now + delay)
+        return delay
+
+    def wait(self, url):
+        delay = self.delay(url)
+
+        if delay:
+            self.clock.sleep(delay)
+
+        return delay
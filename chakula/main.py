@@ -3,12 +3,15 @@
 
 """ A Python logging library with super powers """
 
+import re
 import sys
+import time
 import textwrap
 
+from calendar import timegm
 from os import getcwd, path as p
 from argparse import RawTextHelpFormatter, ArgumentParser
-from pickle import dump, load
+from pickle import load
 from io import open
 from functools import partial, lru_cache
 from signal import signal, SIGINT
@@ -16,8 +19,15 @@ from signal import signal, SIGINT
 import pygogo as gogo
 
 from dateutil.parser import parse as parse_date
-from chakula import tail, __version__
+from chakula import tail, to_epoch, __version__, MAX_FAILURES
 from chakula.formatter import PLACEHOLDERS, Formatter
+from chakula.checkpoint import Journal, apply_journal, dump_atomic, BATCH
+from chakula.feedlist import UrlsFile
+from chakula.filters import Rules, read_rules
+from chakula.sinks import get_sink, POLICIES, QUEUE_SIZE
+from chakula.fetch import BodyCache, fetch
+from chakula.limiter import HostLimiter
+from chakula.replay import Recorder, Replayer
 
 try:
     from redisworks import Root as OldRoot
@@ -27,9 +37,13 @@ except ImportError:
 
 DEF_TIME_FMT = '%Y/%m/%d %H:%M:%S'
 DEF_INTERVAL = '300s'
+DEF_PROBE = '24h'
 CURDIR = p.basename(getcwd())
 LOGFILE = '%s.log' % CURDIR
 FIELDS = sorted(PLACEHOLDERS)
+SINK_METRICS = (
+    'sink %(name)s: %(delivered)d delivered, %(dropped)d dropped, '
+    '%(errors)d failed, latency %(avg_latency).3fs avg %(max_latency).3fs max')
 
 logger = gogo.Gogo(__name__, monolog=True).logger
 
@@ -42,7 +56,16 @@ Examples:
   %(prog)s <url>
   echo '<url>' | %(prog)s --reverse
   %(prog)s -s pubdate -s title -s author <url1> <url2> <url3>
+  %(prog)s --urls-file subscriptions.opml
   %(prog)s --interval 60s --newer "2011/12/20 23:50:12" <url>
+  %(prog)s --host-rate 0.5 --jitter 30s <url1> <url2> <url3>
+  %(prog)s --filter 'keyword: python' --filter '!domain: example.com' <url>
+  %(prog)s --sink stdout --sink file:feeds.log --rotate 1000000 <url>
+  %(prog)s --cache feeds.cache --checkpoint --urls-file subscriptions.opml
+  %(prog)s --cache feeds.cache --quarantined
+  %(prog)s --record feeds.archive --urls-file subscriptions.opml
+  %(prog)s --replay feeds.archive --interval 5m
+  %(prog)s --body-cache bodies --offline <url1> <url2> <url3>
   %(prog)s --format '%%(timestamp)-30s %%(title)s\n' <url>
   %(prog)s --format '%%(title)s was written on %%(pubdate)s\n' <url>
   %(prog)s --format '{timestamp:<30} {title} {author}\n' <url>
@@ -109,6 +132,19 @@ parser.add_argument(
     '-i', '--interval', action='store', help=i_help.format(DEF_INTERVAL),
     type=timespec, default=DEF_INTERVAL)
 
+parser.add_argument(
+    '-j', '--jitter', action='store', type=timespec, default=0,
+    help='Maximum random delay added to the polling interval (default: 0).')
+
+parser.add_argument(
+    '-R', '--host-rate', metavar='RATE', action='store', type=float,
+    help='Maximum number of requests per second to each host '
+    '(default: inf).')
+
+parser.add_argument(
+    '-B', '--host-burst', metavar='NUM', action='store', type=int, default=1,
+    help='Number of requests allowed to burst past --host-rate (default: 1).')
+
 parser.add_argument(
     '-N', '--iterations', action='store', type=int,
     help='Number of times to poll before quiting (default: inf).')
@@ -135,10 +171,96 @@ parser.add_argument(
     '-F', '--format', action='store',
     help='The output format (overrides other format options).')
 
+parser.add_argument(
+    '-U', '--urls-file', metavar='FILE', action='store',
+    help='OPML or text file of urls to tail (reloaded when it changes).')
+
+parser.add_argument(
+    '--filter', metavar='RULE', action='append', default=[],
+    help="Only show entries matching a rule, e.g., 'keyword: python',\n"
+    "'regex: v\\d+', 'author: ...', 'category: ...', 'domain: ...'.\n"
+    "Prefix a rule with '!' to hide matching entries instead.")
+
+parser.add_argument(
+    '--filter-file', metavar='FILE', action='store',
+    help='File of filter rules (one per line).')
+
+parser.add_argument(
+    '-o', '--sink', metavar='SINK', action='append', default=[],
+    help="Where to write entries (default: stdout). May be repeated.\n"
+    "One of stdout, stderr, file:<path>, socket:<path|host:port>,\n"
+    "webhook:<url>, or exec:<command>.")
+
+parser.add_argument(
+    '--sink-queue', metavar='NUM', action='store', type=int,
+    default=QUEUE_SIZE,
+    help='Number of entries each sink may queue (default: {}).'.format(
+        QUEUE_SIZE))
+
+parser.add_argument(
+    '--sink-policy', action='store', choices=sorted(POLICIES),
+    default='block', help='What to do when a sink queue is full '
+    '(default: block).')
+
+parser.add_argument(
+    '--rotate', metavar='BYTES', action='store', type=int, default=0,
+    help='Rotate file sinks once they reach this size (default: never).')
+
 parser.add_argument(
     '-c', '--cache', action='store',
     help='File path to store feed information across multiple runs.')
 
+parser.add_argument(
+    '-b', '--body-cache', metavar='DIR', action='store',
+    help='Directory to save the latest raw content of each feed.')
+
+parser.add_argument(
+    '--offline', action='store_true',
+    help='Read feeds from --body-cache instead of fetching them.')
+
+parser.add_argument(
+    '--record', metavar='FILE', action='store',
+    help='Record all fetched responses into an archive.')
+
+parser.add_argument(
+    '--replay', metavar='FILE', action='store',
+    help='Replay the responses of an archive instead of fetching them.')
+
+parser.add_argument(
+    '--speed', metavar='FACTOR', action='store', type=float,
+    help='Replay speed relative to real time (default: as fast as possible).')
+
+parser.add_argument(
+    '-m', '--max-failures', metavar='NUM', action='store', type=int,
+    default=MAX_FAILURES,
+    help='Number of consecutive failures before a feed is quarantined '
+    '(default: {}).'.format(MAX_FAILURES))
+
+parser.add_argument(
+    '-P', '--probe-interval', metavar='INTERVAL', action='store',
+    type=timespec, default=DEF_PROBE,
+    help='Seconds between polls of a quarantined feed (default: {}).'.format(
+        DEF_PROBE))
+
+parser.add_argument(
+    '-Q', '--quarantined', action='store_true',
+    help='List the quarantined feeds stored in --cache and exit.')
+
+parser.add_argument(
+    '-C', '--checkpoint', action='store_true',
+    help='Checkpoint each feed to a write-ahead log next to --cache\n'
+    '(required) so that a restart resumes each feed where it left off.\n'
+    "Delivery is at-least-once: a crash re-emits one feed's entries (an OS\n"
+    'crash up to --checkpoint-batch feeds\' worth). Each checkpoint waits\n'
+    "until the sinks have delivered the feed's entries, so a slow sink\n"
+    'slows down polling. Entries dropped by --sink-policy drop are still\n'
+    'checkpointed.')
+
+parser.add_argument(
+    '--checkpoint-batch', metavar='NUM', action='store', type=int,
+    default=BATCH,
+    help='Number of checkpoints per fsync (default: {}).'.format(BATCH))
+
 parser.add_argument(
     '-r', '--reverse', action='store_true',
     help='Show entries in reverse order.')
@@ -189,9 +311,7 @@ def update_cache(path, extra, redis=False):
 
         return root.red
     else:
-        with open(path, 'wb') as f:
-            dump(extra, f)
-
+        dump_atomic(path, extra)
         return path
 
 
@@ -199,10 +319,6 @@ def load_extra(path, redis=False):
     if redis:
         root = get_root(path)
         extra = root.extra or {}
-
-        for k, v in extra.items():
-            v['updated'] = tuple(v.get('updated') or [])
-            v['modified'] = tuple(v.get('modified') or [])
     else:
         try:
             with open(path, 'rb') as f:
@@ -210,26 +326,35 @@ def load_extra(path, redis=False):
         except FileNotFoundError:
             extra = {}
 
+    # older caches (and redis) store dates as time tuples or lists
+    for k, v in extra.items():
+        v['updated'] = to_epoch(v.get('updated'))
+        v['modified'] = to_epoch(v.get('modified'))
+
     return extra
 
 
-def run():
-    """CLI runner"""
-    args = parser.parse_args()
-    kwargs = {'monolog': True, 'verbose': args.verbose}
-    logger = gogo.Gogo(__name__, **kwargs).get_logger('run')
-    signal(SIGINT, sigint_handler)
+def checkpoint(journal, sinks, url, state):
+    # only checkpoint once the sinks have delivered the feed's entries
+    for sink in sinks:
+        sink.join()
 
-    if args.version:
-        logger.info('chakula v%s' % __version__)
-        exit(0)
+    journal.checkpoint(url, state)
 
-    if args.newer:
-        newer = parse_date(args.newer).timetuple()
-        logger.debug('showing entries newer than %s', newer)
-    else:
-        newer = None
 
+def show_quarantined(extra, time_fmt=DEF_TIME_FMT, stream=sys.stdout):
+    quarantined = [(k, v) for k, v in extra.items() if v.get('quarantined')]
+
+    for url, state in sorted(quarantined):
+        retry_at = time.strftime(time_fmt, time.localtime(state['retry_at']))
+        msg = '{}\n  failures: {}  next probe: {}  error: {}\n'
+        args = (url, state['failures'], retry_at, state['error'])
+        stream.write(msg.format(*args))
+
+    return len(quarantined)
+
+
+def get_formatter(args):
     if args.format:
         fmt = args.format.replace('\\n', '\n')
         formatter = Formatter(fmt, args.time_format)
@@ -238,18 +363,92 @@ def run():
         pargs = (show, args.time_format, args.heading)
         formatter = Formatter.from_fields(*pargs)
 
-    logger.debug('using format: %r', formatter.fmt)
-    logger.debug('using time format: %r', formatter.time_fmt)
+    return formatter
 
-    info = {
-        'seen': set() if args.unique else None, 'newer': newer,
-        'reverse': args.reverse, 'iterations': args.iterations,
-        'interval': args.interval, 'formatter': formatter,
-        'initial': args.initial, 'logger': logger, 'fail': args.fail}
 
+def get_sinks(args, logger):
+    skwargs = {
+        'maxsize': args.sink_queue, 'policy': args.sink_policy,
+        'max_bytes': args.rotate}
+
+    try:
+        sinks = [get_sink(spec, **skwargs) for spec in args.sink]
+    except (ValueError, OSError) as e:
+        logger.error(e)
+        exit(1)
+
+    return sinks
+
+
+def get_rules(args, logger):
+    rules = read_rules(args.filter_file) if args.filter_file else []
+    rules += args.filter
+
+    try:
+        return Rules(rules) if rules else None
+    except (ValueError, re.error) as e:
+        logger.error(e)
+        exit(1)
+
+
+def get_replayer(args, logger):
+    try:
+        return Replayer(args.replay, speed=args.speed)
+    except OSError as e:
+        logger.error('could not read replay archive: %s', e)
+        exit(1)
+
+
+def check_replay(replayer, urls, logger):
+    missing = replayer.missing(urls)
+
+    if missing:
+        logger.error('not in replay archive %r:', replayer.path)
+
+        for url in missing:
+            logger.error('  %s', url)
+
+        exit(1)
+
+
+def get_fetch_info(args, replayer=None):
+    info = {}
+
+    if replayer:
+        iterations = replayer.get_iterations(args.interval)
+        info['fetcher'] = replayer
+        info['clock'] = replayer.clock
+        info['iterations'] = args.iterations or iterations
+    elif args.body_cache:
+        info['fetcher'] = BodyCache(args.body_cache, offline=args.offline)
+
+    if args.record:
+        info['fetcher'] = Recorder(args.record, info.get('fetcher', fetch))
+
+    if args.host_rate:
+        hargs = (args.host_rate, args.host_burst, info.get('clock', time))
+        info['limiter'] = HostLimiter(*hargs)
+
+    return info
+
+
+def get_urls(args, info, logger, replayer=None):
     first = args.urls[0]
 
-    if hasattr(first, 'isatty') and first.isatty():  # called with no args
+    if args.urls_file:
+        static = [] if hasattr(first, 'read') else args.urls
+
+        try:
+            urls_file = UrlsFile(args.urls_file, static)
+        except OSError as e:
+            logger.error('could not open urls file: %s', e)
+            exit(1)
+
+        info['urls_handler'] = urls_file
+        urls = urls_file.urls
+    elif replayer and hasattr(first, 'read'):
+        urls = replayer.urls
+    elif hasattr(first, 'isatty') and first.isatty():  # called with no args
         # This doesn't work for scripttest though
         parser.print_help()
         sys.exit(0)
@@ -258,13 +457,95 @@ def run():
     else:
         urls = args.urls
 
-    if args.cache:
+    return urls
+
+
+def get_extra(args, info, logger):
+    journal = None
+
+    if args.checkpoint and not args.cache:
+        logger.error('--checkpoint requires --cache')
+        exit(1)
+    elif args.checkpoint:
+        journal = Journal(args.cache, args.checkpoint_batch)
+        extra = apply_journal(args.cache, load_extra(args.cache))
+        info['checkpoint_handler'] = partial(checkpoint, journal, info['sinks'])
+        info['tail_handler'] = journal.compact
+    elif args.cache:
         extra = load_extra(args.cache)
         info['tail_handler'] = partial(update_cache, args.cache)
     else:
         extra = {}
 
-    tail(urls, extra=extra, **info)
+    return extra, journal
+
+
+def run():
+    """CLI runner"""
+    args = parser.parse_args()
+    kwargs = {'monolog': True, 'verbose': args.verbose}
+    logger = gogo.Gogo(__name__, **kwargs).get_logger('run')
+    signal(SIGINT, sigint_handler)
+
+    if args.version:
+        logger.info('chakula v%s' % __version__)
+        exit(0)
+
+    if args.quarantined:
+        if not args.cache:
+            logger.error('--quarantined requires --cache')
+            exit(1)
+
+        extra = apply_journal(args.cache, load_extra(args.cache))
+        num = show_quarantined(extra, args.time_format)
+        logger.info('%d quarantined feed(s)', num)
+        exit(0)
+
+    if args.offline and not args.body_cache:
+        logger.error('--offline requires --body-cache')
+        exit(1)
+
+    if args.newer:
+        newer = timegm(parse_date(args.newer).timetuple())
+        logger.debug('showing entries newer than %s', newer)
+    else:
+        newer = None
+
+    formatter = get_formatter(args)
+    logger.debug('using format: %r', formatter.fmt)
+    logger.debug('using time format: %r', formatter.time_fmt)
+
+    info = {
+        'seen': set() if args.unique else None, 'newer': newer,
+        'reverse': args.reverse, 'iterations': args.iterations,
+        'interval': args.interval, 'formatter': formatter,
+        'initial': args.initial, 'logger': logger, 'fail': args.fail,
+        'jitter': args.jitter, 'max_failures': args.max_failures,
+        'probe': args.probe_interval, 'sinks': get_sinks(args, logger),
+        'rules': get_rules(args, logger)}
+
+    replayer = get_replayer(args, logger) if args.replay else None
+    info.update(get_fetch_info(args, replayer))
+    urls = get_urls(args, info, logger, replayer)
+
+    if replayer:
+        check_replay(replayer, urls, logger)
+    extra, journal = get_extra(args, info, logger)
+    recorder = info.get('fetcher')
+
+    try:
+        tail(urls, extra=extra, **info)
+    finally:
+        if isinstance(recorder, Recorder):
+            recorder.close()
+
+        for sink in info['sinks']:
+            sink.close()
+            logger.info(SINK_METRICS, dict(sink.metrics, name=sink.name))
+
+        if journal:
+            journal.close()
+
     sys.exit(0)
 
 
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+# vim: sw=4:ts=4:expandtab
+
+import time
+import gzip
+import pickle
+
+from bisect import bisect
+from math import ceil
+
+from chakula.fetch import fetch, get_digest, Response
+
+
+class VirtualClock(object):
+    """I stand in for the `time` module so that `tail` can be run faster than
+    real time.
+
+    `sleep` advances my time instantly (or after sleeping `secs / speed`
+    seconds of real time if `speed` is given).
+    """
+    def __init__(self, start=0, speed=None):
+        self.now = start
+        self.speed = speed
+
+    def time(self):
+        return self.now
+
+    def sleep(self, secs):
+        if self.speed:
+            time.sleep(secs / self.speed)
+
+        self.now += secs
+
+
+class Recorder(object):
+    """I wrap a fetcher and record every response into a gzipped archive.
+
+    Bodies are only stored when they differ from the previous response of the
+    same feed, which keeps archives of frequently polled feeds small.
+    """
+    def __init__(self, path, fetcher=fetch, clock=time):
+        self.path = path
+        self.fetcher = fetcher
+        self.clock = clock
+        self.digests = {}
+        self.file = gzip.open(path, 'ab')
+
+    def record(self, url, response=None, error=None):
+        record = {'time': self.clock.time(), 'url': url, 'error': error}
+
+        if response:
+            digest = get_digest(response.body)
+            ok = response.status == 200
+            unchanged = ok and self.digests.get(url) == digest
+
+            if ok:
+                self.digests[url] = digest
+
+            record.update({
+                'href': response.url, 'status': response.status,
+                'headers': response.headers,
+                'body': None if unchanged else response.body})
+
+        pickle.dump(record, self.file, pickle.HIGHEST_PROTOCOL)
+
+    def close(self):
+        self.file.close()
+
+    def __call__(self, url, **kwargs):
+        try:
+            response = self.fetcher(url, **kwargs)
+        except Exception as e:
+            self.record(url, error=repr(e))
+            raise
+
+        self.record(url, response)
+        return response
+
+
+def read_archive(path):
+    """Yield the records of an archive, ignoring a truncated tail."""
+    with gzip.open(path, 'rb') as f:
+        while True:
+            try:
+                yield pickle.load(f)
+            except (EOFError, OSError, pickle.UnpicklingError):
+                break
+
+
+class Replayer(object):
+    """I serve the responses of an archive made by `Recorder`.
+
+    Each request gets the latest response recorded at or before the clock's
+    current time (or the first one if the clock is earlier). Recorded 304s
+    are replaced by the content they refer to, and conditional requests whose
+    etag matches the served one get a 304.
+    """
+    def __init__(self, path, clock=None, speed=None):
+        self.path = path
+        self.timelines = {}
+        latest = {}
+
+        for record in read_archive(path):
+            url, status = record['url'], record.get('status')
+
+            if status == 304 and url in latest:
+                # serve the content the 304 refers to since the replaying
+                # client may not have seen it yet
+                record = dict(latest[url], time=record['time'])
+            elif status == 200 and record['body'] is None:
+                record['body'] = latest[url]['body']
+
+            if record.get('status') == 200:
+                latest[url] = record
+
+            timeline = self.timelines.setdefault(record['url'], ([], []))
+            timeline[0].append(record['time'])
+            timeline[1].append(record)
+
+        stamps = [t[0] for t in self.timelines.values()]
+        self.start = min(s[0] for s in stamps) if stamps else 0
+        self.end = max(s[-1] for s in stamps) if stamps else 0
+        self.clock = clock or VirtualClock(self.start, speed)
+
+    @property
+    def urls(self):
+        return list(self.timelines)
+
+    def get_iterations(self, interval):
+        """The number of polling iterations needed to replay the archive."""
+        return int(ceil((self.end - self.start) / interval)) + 1
+
+    def missing(self, urls):
+        """The urls that have no recorded responses."""
+        return [url for url in urls if url not in self.timelines]
+
+    def __call__(self, url, etag=None, **kwargs):
+        try:
+            stamps, records = self.timelines[url]
+        except KeyError:
+            raise LookupError('%r is not in archive %r' % (url, self.path))
+
+        record = records[max(bisect(stamps, self.clock.time()) - 1, 0)]
+
+        if record['error']:
+            raise IOError('replayed error: %s' % record['error'])
+
+        headers = record['headers']
+
+        if etag and record['status'] == 200 and headers.get('etag') == etag:
+            response = Response(record['href'], 304, headers, b'')
+        else:
+            args = (record['href'], record['status'], headers, record['body'])
+            response = Response(*args)
+
+        return response
@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+# vim: sw=4:ts=4:expandtab
+
+import os
+import sys
+import json
+import time
+import shlex
+import socket
+
+from calendar import timegm
+from io import open
+from queue import Queue, Full
+from subprocess import Popen, PIPE
+from threading import Thread
+from urllib.request import Request, urlopen
+
+import pygogo as gogo
+
+POLICIES = {'block', 'drop'}
+QUEUE_SIZE = 1000
+TIMEOUT = 30
+STOP = object()
+
+logger = gogo.Gogo(__name__, monolog=True).logger
+
+
+def get_payload(entry, content):
+    fields = ['id', 'title', 'link', 'author', 'description']
+    payload = {field: entry.get(field) for field in fields}
+
+    for field in ['published_parsed', 'updated_parsed']:
+        value = entry.get(field)
+        payload[field.split('_')[0]] = timegm(value) if value else None
+
+    payload['content'] = content
+    return payload
+
+
+class Sink(object):
+    """I deliver entries from a bounded queue in my own worker thread.
+
+    A full queue either blocks the caller (the `block` policy) or drops the
+    entry (the `drop` policy), so a slow consumer never stalls polling unless
+    asked to. Subclasses implement `deliver` and optionally `shutdown`.
+    """
+    def __init__(self, name=None, maxsize=QUEUE_SIZE, policy='block'):
+        if policy not in POLICIES:
+            raise ValueError('invalid sink policy {!r}'.format(policy))
+
+        self.name = name or type(self).__name__
+        self.policy = policy
+        self.queue = Queue(maxsize)
+        self.delivered = self.dropped = self.errors = 0
+        self.latency = self.max_latency = 0
+        self.thread = Thread(target=self.work, name=name, daemon=True)
+        self.thread.start()
+
+    def put(self, entry, content):
+        item = (time.time(), entry, content)
+
+        if self.policy == 'drop':
+            try:
+                self.queue.put_nowait(item)
+            except Full:
+                self.dropped += 1
+        else:
+            self.queue.put(item)
+
+    def work(self):
+        while True:
+            item = self.queue.get()
+
+            if item is STOP:
+                self.queue.task_done()
+                break
+
+            queued, entry, content = item
+
+            try:
+                self.deliver(entry, content)
+            except Exception as e:
+                self.errors += 1
+                logger.error('sink %s failed: %s', self.name, e)
+            else:
+                latency = time.time() - queued
+                self.delivered += 1
+                self.latency += latency
+                self.max_latency = max(self.max_latency, latency)
+            finally:
+                self.queue.task_done()
+
+    @property
+    def metrics(self):
+        avg_latency = self.latency / self.delivered if self.delivered else 0
+
+        return {
+            'delivered': self.delivered, 'dropped': self.dropped,
+            'errors': self.errors, 'queued': self.queue.qsize(),
+            'avg_latency': avg_latency, 'max_latency': self.max_latency}
+
+    def join(self):
+        """Wait until all queued entries have been delivered."""
+        self.queue.join()
+
+    def deliver(self, entry, content):
+        raise NotImplementedError
+
+    def shutdown(self):
+        pass
+
+    def close(self):
+        """Deliver all queued entries and stop the worker."""
+        self.queue.put(STOP)
+        self.thread.join()
+        self.shutdown()
+
+
+class StreamSink(Sink):
+    def __init__(self, stream=sys.stdout, **kwargs):
+        self.stream = stream
+        super(StreamSink, self).__init__(**kwargs)
+
+    def deliver(self, entry, content):
+        try:
+            self.stream.write(content)
+        except TypeError:
+            self.stream.write(content.encode('utf-8'))
+
+        try:
+            self.stream.flush()
+        except AttributeError:
+            pass
+
+
+class FileSink(Sink):
+    """I append entries to a file, rotating it once it exceeds `max_bytes`
+    (keeping `backups` old copies)."""
+    def __init__(self, path, max_bytes=0, backups=5, **kwargs):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.file = open(path, 'a', encoding='utf-8')
+        super(FileSink, self).__init__(**kwargs)
+
+    def rotate(self):
+        self.file.close()
+
+        for num in range(self.backups - 1, 0, -1):
+            src = '%s.%d' % (self.path, num)
+
+            if os.path.exists(src):
+                os.replace(src, '%s.%d' % (self.path, num + 1))
+
+        if self.backups:
+            os.replace(self.path, '%s.1' % self.path)
+        else:
+            os.remove(self.path)
+
+        self.file = open(self.path, 'a', encoding='utf-8')
+
+    def deliver(self, entry, content):
+        size = len(content.encode('utf-8'))
+
+        if self.max_bytes and self.file.tell() + size > self.max_bytes:
+            if self.file.tell():
+                self.rotate()
+
+        self.file.write(content)
+        self.file.flush()
+
+    def shutdown(self):
+        self.file.close()
+
+
+class SocketSink(Sink):
+    """I send entries to a unix socket path or a `host:port` tcp address,
+    reconnecting whenever the connection breaks."""
+    def __init__(self, address, **kwargs):
+        if ':' in address:
+            host, port = address.rsplit(':', 1)
+            self.address, self.family = (host, int(port)), socket.AF_INET
+        else:
+            self.address, self.family = address, socket.AF_UNIX
+
+        self.sock = None
+        super(SocketSink, self).__init__(**kwargs)
+
+    def deliver(self, entry, content):
+        if not self.sock:
+            self.sock = socket.socket(self.family, socket.SOCK_STREAM)
+            self.sock.settimeout(TIMEOUT)
+            self.sock.connect(self.address)
+
+        try:
+            self.sock.sendall(content.encode('utf-8'))
+        except OSError:
+            self.shutdown()
+            raise
+
+    def shutdown(self):
+        if self.sock:
+            self.sock.close()
+            self.sock = None
+
+
+class WebhookSink(Sink):
+    """I POST each entry as json to a url."""
+    def __init__(self, url, **kwargs):
+        self.url = url
+        super(WebhookSink, self).__init__(**kwargs)
+
+    def deliver(self, entry, content):
+        data = json.dumps(get_payload(entry, content)).encode('utf-8')
+        headers = {'Content-Type': 'application/json'}
+        request = Request(self.url, data=data, headers=headers)
+
+        with urlopen(request, timeout=TIMEOUT):
+            pass
+
+
+class ProcessSink(Sink):
+    """I write entries to the stdin of a long running command."""
+    def __init__(self, command, **kwargs):
+        self.process = Popen(shlex.split(command), stdin=PIPE)
+        super(ProcessSink, self).__init__(**kwargs)
+
+    def deliver(self, entry, content):
+        self.process.stdin.write(content.encode('utf-8'))
+        self.process.stdin.flush()
+
+    def shutdown(self):
+        self.process.stdin.close()
+        self.process.wait()
+
+
+class HandlerSink(Sink):
+    """I call a `write_handler` style function with each entry.
+
+    `tail` wraps its `write_handler` in me whenever it's given `sinks`.
+    """
+    def __init__(self, handler, **kwargs):
+        self.handler = handler
+        super(HandlerSink, self).__init__(**kwargs)
+
+    def deliver(self, entry, content):
+        self.handler([entry])
+
+
+def get_sink(spec, **kwargs):
+    """Create a sink from a `kind[:target]` spec, e.g., `stdout`,
+    `file:feeds.log`, `socket:/tmp/feeds.sock`, `socket:localhost:9000`,
+    `webhook:http://localhost/hook`, or `exec:jq -R .`.
+    """
+    kind, _, target = spec.partition(':')
+    kwargs.setdefault('name', spec)
+    max_bytes = kwargs.pop('max_bytes', 0)
+
+    if kind in {'stdout', 'stderr'}:
+        sink = StreamSink(getattr(sys, kind), **kwargs)
+    elif kind == 'file' and target:
+        sink = FileSink(target, max_bytes, **kwargs)
+    elif kind == 'socket' and target:
+        sink = SocketSink(target, **kwargs)
+    elif kind == 'webhook' and target:
+        sink = WebhookSink(target, **kwargs)
+    elif kind == 'exec' and target:
+        sink = ProcessSink(target, **kwargs)
+    else:
+        msg = 'invalid sink {!r} - hint: stdout, file:path, webhook:url'
+        raise ValueError(msg.format(spec))
+
+    return sink
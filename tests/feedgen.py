@@ -0,0 +1,229 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# vim: sw=4:ts=4:expandtab
+
+"""
+tests.feedgen
+~~~~~~~~~~~~~
+
+Provides a synthetic feed generator and a local feed server for scale tests.
+
+Examples:
+    >>> feed = gen_feed('test', entries=2, size=10)
+    >>> feed.startswith(b'<?xml')
+    True
+    >>> with FeedServer(entries=3) as server:
+    ...     url = server.get_url(1)
+"""
+
+import time
+import random
+
+from hashlib import sha1
+from http.server import HTTPServer, BaseHTTPRequestHandler
+from socketserver import ThreadingMixIn
+from threading import Thread, Lock
+from xml.sax.saxutils import escape
+
+EPOCH = 1483228800  # 2017-01-01
+WORDS = ['lorem', 'ipsum', 'dolor', 'sit', 'amet', 'consectetur', 'chakula']
+
+RSS_HEAD = (
+    '<?xml version="1.0" encoding="{encoding}"?>\n<rss version="2.0"><channel>'
+    '<title>{title}</title><link>http://example.com/{name}</link>'
+    '<description>{title}</description><lastBuildDate>{updated}'
+    '</lastBuildDate>')
+
+RSS_ENTRY = (
+    '<item><title>{title}</title><link>http://example.com/{id}</link>'
+    '<guid>{id}</guid><author>{author}</author><pubDate>{date}</pubDate>'
+    '<description>{description}</description></item>')
+
+ATOM_HEAD = (
+    '<?xml version="1.0" encoding="{encoding}"?>\n'
+    '<feed xmlns="http://www.w3.org/2005/Atom"><title>{title}</title>'
+    '<id>urn:{name}</id><updated>{updated}</updated>')
+
+ATOM_ENTRY = (
+    '<entry><title>{title}</title><link href="http://example.com/{id}"/>'
+    '<id>urn:{id}</id><author><name>{author}</name></author>'
+    '<published>{date}</published><updated>{date}</updated>'
+    '<summary>{description}</summary></entry>')
+
+TAILS = {'rss': '</channel></rss>', 'atom': '</feed>'}
+
+
+def format_date(stamp, fmt='rss'):
+    if fmt == 'rss':
+        return time.strftime('%a, %d %b %Y %H:%M:%S GMT', time.gmtime(stamp))
+    else:
+        return time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(stamp))
+
+
+def gen_feed(name, entries=10, size=200, order='desc', encoding='utf-8',
+             fmt='rss', bozo=False, start=EPOCH, step=3600, seed=None):
+    """Generate the raw content of an RSS or Atom feed.
+
+    Args:
+        name (str): The feed name (used in titles and entry ids).
+        entries (int): The number of entries.
+        size (int): The approximate size (in characters) of each entry's
+            description.
+        order (str): The entry date order, one of `desc`, `asc`, or `random`.
+        encoding (str): The document encoding, e.g., `utf-8`, `iso-8859-1`,
+            or `utf-16`.
+        fmt (str): The feed format, either `rss` or `atom`.
+        bozo (bool): Generate a malformed (truncated) document.
+        start (int): The epoch of the oldest entry.
+        step (int): The number of seconds between entries.
+        seed (int): The random seed (used by the `random` order).
+
+    Returns:
+        bytes: The feed content.
+    """
+    rand = random.Random(seed if seed is not None else name)
+    stamps = [start + i * step for i in range(entries)]
+
+    if order == 'desc':
+        stamps.reverse()
+    elif order == 'random':
+        rand.shuffle(stamps)
+
+    if fmt == 'rss':
+        head, entry = RSS_HEAD, RSS_ENTRY
+    else:
+        head, entry = ATOM_HEAD, ATOM_ENTRY
+
+    updated = max(stamps) if stamps else start
+    title = escape('Feed {} – ünïcödé'.format(name))
+    kwargs = {'encoding': encoding, 'name': name, 'title': title}
+    parts = [head.format(updated=format_date(updated, fmt), **kwargs)]
+    filler = ' '.join(rand.choice(WORDS) for _ in range(size // 6 + 1))
+
+    for stamp in stamps:
+        parts.append(entry.format(
+            id='{}/{}'.format(name, stamp), author='author@example.com',
+            title=escape('{} entry {}'.format(name, stamp)),
+            date=format_date(stamp, fmt),
+            description=escape('<p>{}</p>'.format(filler[:size]))))
+
+    if not bozo:
+        parts.append(TAILS[fmt])
+
+    return ''.join(parts).encode(encoding, 'xmlcharrefreplace')
+
+
+class FeedHandler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        server.count('requests')
+
+        if server.latency:
+            time.sleep(server.latency)
+
+        if server.fails(self.path):
+            server.count('failures')
+            status = server.rand.choice(server.fail_statuses)
+            self.send_response(status)
+
+            if status in {429, 503}:
+                self.send_header('Retry-After', '1')
+
+            self.end_headers()
+            return
+
+        body = server.get_feed(self.path)
+
+        if body is None:
+            self.send_error(404)
+            return
+
+        etag = '"{}"'.format(sha1(body).hexdigest())
+
+        if self.headers.get('If-None-Match') == etag:
+            server.count('not_modified')
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/xml')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024
+
+
+class FeedServer(ThreadingHTTPServer):
+    """I serve generated feeds at `/feeds/<num>.xml` from a background thread.
+
+    Feeds are generated lazily (and cached) from the `gen_feed` keyword
+    arguments I'm given. Responses support ETag/304, and can be delayed by
+    `latency` seconds or fail with one of `fail_statuses` at `failure_rate`.
+    Paths in `failing` always fail. `stats` counts requests, 304s and
+    failures.
+    """
+    def __init__(self, latency=0, failure_rate=0, fail_statuses=(500,),
+                 failing=None, seed=0, **kwargs):
+        super(FeedServer, self).__init__(('127.0.0.1', 0), FeedHandler)
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.fail_statuses = list(fail_statuses)
+        self.failing = set(failing or [])
+        self.rand = random.Random(seed)
+        self.kwargs = kwargs
+        self.feeds = {}
+        self.stats = {'requests': 0, 'not_modified': 0, 'failures': 0}
+        self.lock = Lock()
+        self.thread = Thread(target=self.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
+
+    def count(self, stat):
+        with self.lock:
+            self.stats[stat] += 1
+
+    def fails(self, path):
+        if path in self.failing:
+            return True
+
+        with self.lock:
+            return self.rand.random() < self.failure_rate
+
+    def get_path(self, num):
+        return '/feeds/{}.xml'.format(num)
+
+    def get_url(self, num):
+        host, port = self.server_address
+        return 'http://{}:{}{}'.format(host, port, self.get_path(num))
+
+    def get_feed(self, path):
+        if not (path.startswith('/feeds/') and path.endswith('.xml')):
+            return None
+
+        if path not in self.feeds:
+            name = path[len('/feeds/'):-len('.xml')]
+            self.feeds[path] = gen_feed(name, **self.kwargs)
+
+        return self.feeds[path]
+
+    def update(self, num, **kwargs):
+        """Regenerate a feed, e.g., with more entries."""
+        path = self.get_path(num)
+        name = path[len('/feeds/'):-len('.xml')]
+        self.feeds[path] = gen_feed(name, **dict(self.kwargs, **kwargs))
@@ -0,0 +1,71 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import time
+
+from io import StringIO
+from os import path as p
+
+from chakula import tail
+from chakula.fetch import Response
+from chakula.main import show_quarantined
+
+CUR_DIR = p.abspath(p.dirname(__file__))
+FEED = p.join(CUR_DIR, 'feeds', 'jenkins.rss')
+
+
+def test_quarantine(tmpdir):
+    bad = tmpdir.join('bad.rss')
+    bad.write('not a feed <<<')
+    url = str(bad)
+    extra = tail([url], iterations=1, interval=10, max_failures=2, probe=3600)
+    state = extra[url]
+    assert state['failures'] == 1
+    assert not state['quarantined']
+    assert 5 < state['retry_at'] - time.time() <= 10
+
+    # the cooldown hasn't expired yet so the feed is skipped
+    extra = tail([url], extra=extra, iterations=1, max_failures=2)
+    assert extra[url]['failures'] == 1
+
+    state['retry_at'] = 0
+    extra = tail([url], extra=extra, iterations=1, max_failures=2, probe=3600)
+    state = extra[url]
+    assert state['failures'] == 2
+    assert state['quarantined']
+    assert 3500 < state['retry_at'] - time.time() <= 3600
+
+    stream = StringIO()
+    assert show_quarantined(extra, stream=stream) == 1
+    assert stream.getvalue().startswith(url)
+
+    bad.write('<rss version="2.0"><channel><title>ok</title></channel></rss>')
+    state['retry_at'] = 0
+    extra = tail([url], extra=extra, iterations=1, max_failures=2)
+    assert not extra[url].get('failures')
+    assert not extra[url].get('quarantined')
+
+
+def test_throttled_probe_keeps_quarantine():
+    url = 'http://example.com/rss'
+    extra = {url: {'failures': 5, 'quarantined': True, 'retry_at': 0}}
+    fetcher = lambda url, **kwargs: Response(url, 429, {}, b'')
+    extra = tail([url], extra=extra, iterations=1, fetcher=fetcher)
+    assert extra[url]['failures'] == 5
+    assert extra[url]['quarantined']
+
+
+def test_write_failures_quarantine():
+    url = FEED
+    extra = {}
+
+    def rules(entries):
+        raise ValueError('bad rules')
+
+    for _ in range(2):
+        kwargs = {'extra': extra, 'rules': rules, 'max_failures': 2}
+        extra = tail([url], iterations=1, **kwargs)
+        extra[url]['retry_at'] = 0
+
+    assert extra[url]['failures'] == 2
+    assert extra[url]['quarantined']
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import pickle
+
+from io import StringIO
+from os import path as p
+
+from chakula import tail
+from chakula.checkpoint import Journal, apply_journal
+
+CUR_DIR = p.abspath(p.dirname(__file__))
+FEED = p.join(CUR_DIR, 'feeds', 'jenkins.rss')
+
+
+def test_resume_from_journal(tmpdir):
+    cache = str(tmpdir.join('cache'))
+    journal = Journal(cache, batch=10)
+    stream = StringIO()
+    kwargs = {'checkpoint_handler': journal.checkpoint, 'iterations': 1}
+    tail([FEED], stream=stream, **kwargs)
+    assert len(stream.getvalue().splitlines()) == 5
+
+    # crash before the cache is saved, leaving a partially written record
+    journal.file.write(b'\x80\x04\x95')
+    journal.file.close()
+    assert not p.exists(cache)
+
+    extra = apply_journal(cache, {})
+    assert extra[FEED]['updated']
+
+    stream = StringIO()
+    journal = Journal(cache)
+    kwargs['checkpoint_handler'] = journal.checkpoint
+    kwargs['tail_handler'] = journal.compact
+    tail([FEED], extra=extra, stream=stream, **kwargs)
+    journal.close()
+    assert stream.getvalue() == ''
+
+    with open(cache, 'rb') as f:
+        assert pickle.load(f) == extra
+
+    assert p.getsize('%s.wal' % cache) == 0
+
+
+def test_append_after_torn_record(tmpdir):
+    cache = str(tmpdir.join('cache'))
+    journal = Journal(cache)
+    journal.checkpoint('a', {'etag': 'a'})
+    journal.file.write(b'\x80\x04\x95')
+    journal.file.close()
+
+    journal = Journal(cache)
+    journal.checkpoint('b', {'etag': 'b'})
+    journal.close()
+
+    extra = apply_journal(cache, {})
+    assert extra == {'a': {'etag': 'a'}, 'b': {'etag': 'b'}}
@@ -0,0 +1,28 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import time
+
+import chakula
+
+from chakula import to_epoch, get_stamps, select_newer, last_update
+
+
+def make_entries(num):
+    return [{'published_parsed': time.gmtime(i * 60)} for i in range(num)]
+
+
+def test_to_epoch():
+    assert to_epoch(time.gmtime(1325760105)) == 1325760105
+    assert to_epoch([2012, 1, 5, 10, 41, 45, 3, 5, 0]) == 1325760105
+    assert to_epoch(None) is None
+
+
+def test_select_newer():
+    entries = make_entries(1000)
+    stamps = get_stamps(entries)
+    assert stamps[:3] == [0, 60, 120]
+    assert select_newer(entries, stamps, 500 * 60) == entries[501:]
+    assert last_update(stamps) == 999 * 60
+
+    assert last_update([]) == chakula.MIN_DATE
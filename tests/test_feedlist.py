@@ -0,0 +1,68 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import os
+
+import pytest
+
+from chakula import tail
+from chakula.feedlist import read_urls, UrlsFile
+
+OPML = '''<?xml version="1.0" encoding="UTF-8"?>
+<opml version="1.0">
+  <body>
+    <outline text="news">
+      <outline text="a" type="rss" xmlUrl="http://a.com/rss"/>
+      <outline text="b" type="rss" xmlUrl="http://b.com/rss"/>
+    </outline>
+    <outline text="a again" type="rss" xmlUrl="http://a.com/rss"/>
+  </body>
+</opml>
+'''
+
+
+def test_read_urls(tmpdir):
+    opml = tmpdir.join('feeds.opml')
+    opml.write(OPML)
+    assert read_urls(str(opml)) == ['http://a.com/rss', 'http://b.com/rss']
+
+    text = tmpdir.join('feeds.txt')
+    text.write('# comment\nhttp://a.com/rss\n\nhttp://c.com/rss\n')
+    assert read_urls(str(text)) == ['http://a.com/rss', 'http://c.com/rss']
+
+
+def test_urls_file_reload(tmpdir):
+    text = tmpdir.join('feeds.txt')
+    text.write('http://a.com/rss\n')
+    urls_file = UrlsFile(str(text), ['http://b.com/rss'])
+    urls = urls_file()
+    assert urls == ['http://b.com/rss', 'http://a.com/rss']
+    assert urls_file(urls) is urls
+
+    # a change is only applied once the file has settled
+    text.write('http://c.com/rss\nhttp://d.com/rss\n')
+    os.utime(str(text), ns=(0, 0))
+    assert urls_file(urls) is urls
+    assert urls_file(urls) == [
+        'http://b.com/rss', 'http://c.com/rss', 'http://d.com/rss']
+
+    # an emptied file is ignored
+    urls = urls_file.urls
+    text.write('')
+    urls_file(urls)
+    assert urls_file(urls) is urls
+
+
+def test_urls_file_missing(tmpdir):
+    with pytest.raises(FileNotFoundError):
+        UrlsFile(str(tmpdir.join('missing.txt')))
+
+
+def test_tail_drops_removed_urls():
+    extra = {'http://a.com/rss': {'etag': 'a'}}
+    urls_handler = lambda urls: []
+    result = tail(
+        ['http://a.com/rss'], extra=extra, iterations=1,
+        urls_handler=urls_handler)
+
+    assert result == {}
@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+from os import path as p
+
+import pytest
+
+from chakula import parse_url
+from chakula.fetch import fetch, BodyCache
+
+CUR_DIR = p.abspath(p.dirname(__file__))
+FEED = p.join(CUR_DIR, 'feeds', 'jenkins.rss')
+
+
+def test_content_hash_short_circuit():
+    calls = []
+
+    def fetcher(url, **kwargs):
+        calls.append(url)
+        return fetch(url, **kwargs)
+
+    entries, info = parse_url(FEED, 0, fetcher=fetcher)
+    assert len(entries) == 5
+    assert info['digest']
+
+    entries, info2 = parse_url(FEED, 1, fetcher=fetcher, **info)
+    assert entries == []
+    assert info2 == info
+    assert len(calls) == 2
+
+
+def test_body_cache(tmpdir):
+    cache = BodyCache(str(tmpdir))
+    response = cache(FEED)
+    assert response.status == 200
+    assert cache.replay(FEED) == response
+
+    offline = BodyCache(str(tmpdir), offline=True)
+    entries, info = parse_url(FEED, 0, fetcher=offline)
+    assert len(entries) == 5
+
+    with pytest.raises(LookupError):
+        offline('http://example.com/rss')
+
+    # a body that doesn't match its metadata is rejected
+    body_path = cache.get_paths(FEED)[0]
+
+    with open(body_path, 'wb') as f:
+        f.write(b'<rss/>')
+
+    with pytest.raises(ValueError):
+        offline(FEED)
+
+
+def test_local_files(tmpdir):
+    path = tmpdir.join('feed.rss')
+
+    with open(FEED, 'rb') as f:
+        path.write_binary(f.read())
+
+    response = fetch(str(path))
+    assert response.status == 200
+    assert fetch(str(path), etag=response.headers['etag']).status == 304
+
+    entries, info = parse_url('file://%s' % path, 0)
+    assert len(entries) == 5
+
+    entries, info = parse_url(str(path), 1, **info)
+    assert entries == []
+
+    path.write('<rss version="2.0"><channel></channel></rss>')
+    entries, info2 = parse_url(str(path), 1, **info)
+    assert info2['etag'] != info['etag']
@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import pytest
+
+from chakula.filters import Rules
+
+ENTRIES = [
+    {
+        'title': 'Python 3.6 released', 'author': 'Guido',
+        'link': 'http://blog.python.org/36', 'tags': [{'term': 'News'}]},
+    {
+        'title': 'Jython news', 'author': 'Frank',
+        'link': 'http://www.jython.org/news', 'tags': []},
+    {
+        'title': 'Build #1006', 'author': 'Hudson',
+        'link': 'http://ci.example.com/1006',
+        'description': 'pip_python2.6 FAILURE'},
+]
+
+
+def get_titles(rules):
+    return [entry['title'] for entry in Rules(rules)(ENTRIES)]
+
+
+def test_rules():
+    assert len(get_titles([])) == 3
+    assert get_titles(['keyword: python']) == ['Python 3.6 released']
+    assert get_titles(['regex: #\\d+']) == ['Build #1006']
+    assert get_titles(['regex: python\\d']) == ['Build #1006']
+    assert get_titles(['author: frank']) == ['Jython news']
+    assert get_titles(['category: news']) == ['Python 3.6 released']
+    assert get_titles(['domain: example.com']) == ['Build #1006']
+    assert get_titles(['!domain: org']) == ['Build #1006']
+
+    rules = ['keyword: python', 'keyword: jython', '!author: guido']
+    assert get_titles(rules) == ['Jython news']
+
+
+def test_keyword_boundaries():
+    entries = [{'title': 'Learning C++ today'}, {'title': 'C++11 notes'}]
+    matched = Rules(['keyword: c++'])(entries)
+    assert [entry['title'] for entry in matched] == ['Learning C++ today']
+
+
+def test_regex_groups_and_flags():
+    entries = [{'title': 'bb'}, {'title': 'FAILURE'}, {'title': 'ab'}]
+    get = lambda rules: [e['title'] for e in Rules(rules)(entries)]
+    assert get(['regex: (a)\\1', 'regex: (b)\\1']) == ['bb']
+    assert get(['regex: (?P<x>a)b', 'regex: (?P<x>f)']) == ['FAILURE', 'ab']
+    assert get(['regex: (?i)failure', 'keyword: bb']) == ['bb', 'FAILURE']
+
+    with pytest.raises(ValueError):
+        Rules(['regex: (a'])
@@ -19,3 +19,10 @@ def test_placeholder_style_detect():
 
     f = Formatter('{asdf} {zxcv} %(qwerty)s %(azerty)s')
     assert not f.is_newstyle
+
+
+def test_formatter_hash():
+    f = Formatter('%(title)s\n')
+    assert Formatter('%(title)s\n') == f
+    assert hash(Formatter('%(title)s\n')) == hash(f)
+    assert Formatter('%(title)s\n', '%Y') != f
@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+import time
+
+from chakula import tail, throttle
+from chakula.fetch import Response
+from chakula.limiter import HostLimiter, parse_retry_after, get_backoff
+
+
+def test_retry_after():
+    assert parse_retry_after('120') == 120
+    assert parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT', 1445412420) == 60
+    assert parse_retry_after(None) is None
+    assert get_backoff(3, 60) == 240
+
+
+def test_host_limiter():
+    limiter = HostLimiter(rate=2, burst=2)
+    url = 'http://a.com/rss'
+    assert limiter.delay(url, now=0) == 0
+    assert limiter.delay(url, now=0) == 0
+    assert limiter.delay(url, now=0) == 0.5
+    assert limiter.delay(url, now=0) == 1
+    assert limiter.delay('/some/local/file.rss', now=0) == 0
+
+    urls = ['http://a.com/1', 'http://a.com/2', 'http://b.com/1']
+    assert limiter.order(urls) == [
+        'http://a.com/1', 'http://b.com/1', 'http://a.com/2']
+
+
+def test_throttle():
+    response = Response('http://a.com/rss', 429, {'retry-after': '30'}, b'')
+    info = throttle('http://a.com/rss', response, etag='abc', backoffs=1)
+    assert info['etag'] == 'abc'
+    assert info['backoffs'] == 2
+    assert 25 < info['retry_at'] - time.time() <= 30
+
+    response = Response('http://a.com/rss', 503, {}, b'')
+    info = throttle('http://a.com/rss', response, backoff=10, backoffs=2)
+    assert 35 < info['retry_at'] - time.time() <= 40
+
+
+def test_tail_skips_backed_off_urls():
+    state = {'backoffs': 1, 'retry_at': time.time() + 60}
+    extra = {'http://a.invalid/rss': state}
+    result = tail(['http://a.invalid/rss'], extra=extra, iterations=1)
+    assert result['http://a.invalid/rss'] is state
@@ -0,0 +1,49 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+from io import StringIO
+from os import path as p
+
+import pytest
+
+from chakula import tail
+from chakula.replay import Recorder, Replayer, VirtualClock, read_archive
+
+CUR_DIR = p.abspath(p.dirname(__file__))
+FEED = p.join(CUR_DIR, 'feeds', 'jenkins.rss')
+
+
+def test_record_and_replay(tmpdir):
+    archive = str(tmpdir.join('feeds.archive'))
+    clock = VirtualClock(1000)
+    recorder = Recorder(archive, clock=clock)
+    tail([FEED], iterations=3, interval=60, fetcher=recorder, clock=clock)
+    recorder.close()
+
+    records = list(read_archive(archive))
+    assert [r['time'] for r in records] == [1000, 1060, 1120]
+    assert records[0]['body']
+    assert [r['status'] for r in records] == [200, 304, 304]
+
+    replayer = Replayer(archive)
+    assert replayer.urls == [FEED]
+    assert replayer.get_iterations(60) == 3
+
+    stream = StringIO()
+    kwargs = {'fetcher': replayer, 'clock': replayer.clock, 'stream': stream}
+    tail(replayer.urls, iterations=10000, interval=60, **kwargs)
+    assert replayer.clock.time() == 1000 + 9999 * 60
+    assert len(stream.getvalue().splitlines()) == 5
+
+
+def test_replay_missing_url(tmpdir):
+    archive = str(tmpdir.join('feeds.archive'))
+    recorder = Recorder(archive, clock=VirtualClock(1000))
+    recorder(FEED)
+    recorder.close()
+
+    replayer = Replayer(archive)
+    assert replayer.missing([FEED, 'http://a.com/rss']) == ['http://a.com/rss']
+
+    with pytest.raises(LookupError):
+        replayer('http://a.com/rss')
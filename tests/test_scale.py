@@ -0,0 +1,73 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+"""
+tests.test_scale
+~~~~~~~~~~~~~~~~
+
+Drives `tail` against many generated feeds served locally. Set the
+CHAKULA_SCALE_URLS environment variable (e.g., to 10000) for a full scale run.
+"""
+
+import os
+
+from io import StringIO
+
+import feedparser
+import pytest
+
+from chakula import tail
+from chakula.replay import VirtualClock
+from feedgen import gen_feed, FeedServer
+
+NUM_URLS = int(os.environ.get('CHAKULA_SCALE_URLS', 100))
+
+
+@pytest.mark.parametrize('kwargs', [
+    {'fmt': 'rss', 'order': 'desc'},
+    {'fmt': 'atom', 'order': 'random'},
+    {'fmt': 'rss', 'encoding': 'iso-8859-1'},
+    {'fmt': 'atom', 'encoding': 'utf-16', 'order': 'asc'},
+])
+def test_gen_feed(kwargs):
+    feed = feedparser.parse(gen_feed('test', entries=7, **kwargs))
+    assert not feed.bozo
+    assert len(feed.entries) == 7
+
+
+def test_gen_bozo_feed():
+    assert feedparser.parse(gen_feed('test', bozo=True)).bozo
+
+
+def test_many_feeds():
+    with FeedServer(entries=5, size=500) as server:
+        urls = [server.get_url(num) for num in range(NUM_URLS)]
+        stream = StringIO()
+        kwargs = {'stream': stream, 'clock': VirtualClock(), 'interval': 60}
+        extra = tail(urls, iterations=2, **kwargs)
+
+        assert len(stream.getvalue().splitlines()) == NUM_URLS * 5
+        assert server.stats['requests'] == NUM_URLS * 2
+        assert server.stats['not_modified'] == NUM_URLS
+
+        server.update(0, entries=6)
+        stream = StringIO()
+        kwargs['stream'] = stream
+        tail(urls, iteration=1, iterations=2, extra=extra, **kwargs)
+        assert len(stream.getvalue().splitlines()) == 1
+
+
+def test_failure_injection():
+    failing = {'/feeds/0.xml'}
+    kwargs = {'entries': 2, 'failing': failing, 'fail_statuses': [500]}
+
+    with FeedServer(**kwargs) as server:
+        urls = [server.get_url(num) for num in range(10)]
+        clock = VirtualClock()
+        extra = tail(
+            urls, iterations=6, interval=60, clock=clock, max_failures=3,
+            stream=StringIO())
+
+        assert extra[urls[0]]['quarantined']
+        assert server.stats['failures'] == 3
+        assert not any(extra[url].get('failures') for url in urls[1:])
@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+# encoding: utf-8
+
+from io import StringIO
+from os import path as p
+from threading import Event, current_thread
+
+from chakula import tail, write_entries
+from chakula.sinks import Sink, StreamSink, FileSink
+
+CUR_DIR = p.abspath(p.dirname(__file__))
+FEED = p.join(CUR_DIR, 'feeds', 'jenkins.rss')
+
+ENTRIES = [{'id': str(i), 'title': 'entry %i' % i} for i in range(5)]
+
+
+class BlockedSink(Sink):
+    def __init__(self, **kwargs):
+        self.event = Event()
+        self.received = []
+        super(BlockedSink, self).__init__(**kwargs)
+
+    def deliver(self, entry, content):
+        self.event.wait()
+        self.received.append(content)
+
+
+def test_fan_out():
+    stream = StringIO()
+    sinks = [StreamSink(stream), StreamSink(StringIO())]
+    write_entries(list(ENTRIES), sinks=sinks, stream=StringIO())
+
+    for sink in sinks:
+        sink.close()
+        assert sink.metrics['delivered'] == 5
+
+    assert stream.getvalue().splitlines()[0] == 'entry 0'
+
+
+def test_drop_policy():
+    sink = BlockedSink(maxsize=2, policy='drop')
+    write_entries(list(ENTRIES), sinks=[sink])
+
+    # the first entry is being delivered and 2 are queued
+    assert sink.dropped in {2, 3}
+    sink.event.set()
+    sink.close()
+    assert sink.metrics['delivered'] == 5 - sink.dropped
+    assert sink.received[0] == 'entry 0\n'
+
+
+def test_file_rotation(tmpdir):
+    path = tmpdir.join('feeds.log')
+    sink = FileSink(str(path), max_bytes=20, backups=1)
+    write_entries(list(ENTRIES), sinks=[sink])
+    sink.close()
+
+    assert path.read() == 'entry 4\n'
+    assert tmpdir.join('feeds.log.1').read() == 'entry 2\nentry 3\n'
+    assert not tmpdir.join('feeds.log.2').exists()
+
+
+def test_write_handler_sink():
+    threads, received = set(), []
+
+    def write_handler(entries):
+        threads.add(current_thread())
+        received.extend(entries)
+
+    sinks = [StreamSink(StringIO())]
+    tail([FEED], iterations=1, sinks=sinks, write_handler=write_handler)
+    sinks[0].close()
+
+    assert len(received) == 5
+    assert current_thread() not in threads